@@ -3,9 +3,12 @@ import datetime
 import logging
 import re
 import math
-import xmltodict
-from lxml import html
-from typing import List, Optional, Union
+import time
+import collections
+import concurrent.futures
+from io import BytesIO
+from lxml import html, etree
+from typing import Iterator, List, Optional, Union
 import findpapers.utils.common_util as common_util
 import findpapers.utils.query_util as query_util
 from findpapers.models.search import Search
@@ -17,6 +20,29 @@ from findpapers.utils.requests_util import DefaultSession
 DATABASE_LABEL = "PubMed"
 BASE_URL = "https://eutils.ncbi.nlm.nih.gov"
 MAX_ENTRIES_PER_PAGE = 50
+MAX_CONCURRENT_REQUESTS = 3  # max number of result pages (esearch + efetch) being fetched at the same time
+MAX_RATE_LIMIT_BACKOFF = 8  # max delay in seconds before retrying a rate limited (HTTP 429) request
+
+# NCBI E-utilities allow up to 3 requests per second without an API key,
+# this throttle is shared by all the requests, whatever thread they come from
+NCBI_THROTTLE = common_util.RequestThrottle(1 / 3)
+
+# The API responses are parsed without resolving entities or fetching anything from the network,
+# so a tampered response can't make us read local files or reach other hosts (XXE)
+XML_PARSER = etree.XMLParser(resolve_entities=False, no_network=True)
+
+# Precompiled XPath expressions for the PubmedArticle fields that we use, they're evaluated on each paper entry.
+# Smart strings are disabled because they keep a reference to the (already processed) paper entry tree
+PUBLICATION_TITLE_XPATH = etree.XPath("MedlineCitation/Article/Journal/Title/text()", smart_strings=False)
+PUBLICATION_ISSN_XPATH = etree.XPath("MedlineCitation/Article/Journal/ISSN/text()", smart_strings=False)
+PAPER_TITLE_XPATH = etree.XPath("string(MedlineCitation/Article/ArticleTitle)", smart_strings=False)
+PAPER_ARTICLE_DATE_XPATH = etree.XPath("MedlineCitation/Article/ArticleDate")
+PAPER_JOURNAL_PUB_DATE_XPATH = etree.XPath("MedlineCitation/Article/Journal/JournalIssue/PubDate")
+PAPER_DOI_XPATH = etree.XPath("PubmedData/ArticleIdList/ArticleId[@IdType='doi']/text()", smart_strings=False)
+PAPER_ABSTRACT_XPATH = etree.XPath("MedlineCitation/Article/Abstract/AbstractText")
+PAPER_KEYWORDS_XPATH = etree.XPath("MedlineCitation/KeywordList/Keyword")
+PAPER_AUTHORS_XPATH = etree.XPath("MedlineCitation/Article/AuthorList/Author")
+PAPER_PAGES_XPATH = etree.XPath("MedlineCitation/Article/Pagination/MedlinePgn/text()", smart_strings=False)
 
 
 def _get_search_url(search: Search, start_record: Optional[int] = 0) -> str:
@@ -55,9 +81,47 @@ def _get_search_url(search: Search, start_record: Optional[int] = 0) -> str:
     return url
 
 
+def _get_content(url: str) -> bytes:
+    """
+    This method return the raw content of a PubMed API URL, the requests are throttled to respect the NCBI rate limit
+    and retried with an exponential backoff when the rate limit is exceeded anyway.
+    It raises an error when the response isn't ok (e.g., server errors), so the request can be retried
+    instead of parsing an error body
+
+    Parameters
+    ----------
+    url : str
+        A PubMed API URL
+
+    Returns
+    -------
+    bytes
+        the raw content of the response
+
+    Raises
+    ------
+    requests.HTTPError
+        - When the response isn't ok
+    """
+
+    backoff = 1
+    while True:
+        NCBI_THROTTLE.wait()
+        response = DefaultSession().get(url)
+        if response.status_code != 429 or backoff > MAX_RATE_LIMIT_BACKOFF:
+            break
+        logging.debug(f"PubMed rate limit exceeded, retrying in {backoff}s")
+        time.sleep(backoff)
+        backoff *= 2
+
+    response.raise_for_status()
+
+    return response.content
+
+
 def _get_api_result(
     search: Search, start_record: Optional[int] = 0
-) -> dict:  # pragma: no cover
+) -> etree._Element:  # pragma: no cover
     """
     This method return results from PubMed database using the provided search parameters
 
@@ -70,18 +134,18 @@ def _get_api_result(
 
     Returns
     -------
-    dict
+    etree._Element
         a result from PubMed database
     """
 
     url = _get_search_url(search, start_record)
 
     return common_util.try_success(
-        lambda: xmltodict.parse(DefaultSession().get(url).content), 2, pre_delay=1
+        lambda: etree.fromstring(_get_content(url), XML_PARSER), 2, pre_delay=0
     )
 
 
-def _get_paper_entry(pubmed_id: Union[str, List[str]]) -> dict:  # pragma: no cover
+def _get_paper_entry(pubmed_id: Union[str, List[str]]) -> bytes:  # pragma: no cover
     """
     This method return paper data from PubMed database using the provided PubMed ID
 
@@ -92,8 +156,8 @@ def _get_paper_entry(pubmed_id: Union[str, List[str]]) -> dict:  # pragma: no co
 
     Returns
     -------
-    dict
-        a paper entry from PubMed database
+    bytes
+        the raw XML of the paper entries from PubMed database
     """
 
     if isinstance(pubmed_id, list):
@@ -102,17 +166,67 @@ def _get_paper_entry(pubmed_id: Union[str, List[str]]) -> dict:  # pragma: no co
     url = f"{BASE_URL}/entrez/eutils/efetch.fcgi?db=pubmed&id={pubmed_id}&rettype=abstract"
 
     return common_util.try_success(
-        lambda: xmltodict.parse(DefaultSession().get(url).content), 2, pre_delay=0
+        lambda: _get_content(url), 2, pre_delay=0
     )
 
 
-def _get_publication(paper_entry: dict) -> Publication:
+def _get_paper_entries_page(search: Search, start_record: int) -> bytes:
+    """
+    This method return the paper entries of a PubMed results page, it fetches the
+    PubMed IDs of the page and then the paper data of all of them at once
+
+    Parameters
+    ----------
+    search : Search
+        A search instance
+    start_record : int
+        Sequence number of first record of the page
+
+    Returns
+    -------
+    bytes
+        the raw XML of the paper entries of the page from PubMed database
+    """
+
+    result = _get_api_result(search, start_record)
+    pubmed_ids = [x.text for x in result.findall("IdList/Id")]
+
+    return _get_paper_entry(pubmed_ids)
+
+
+def _get_paper_entries(content: bytes) -> Iterator[etree._Element]:
+    """
+    This method iterates over the paper entries of a PubMed efetch result,
+    each entry is released right after being processed, so the whole result tree is never kept in memory
+
+    Parameters
+    ----------
+    content : bytes
+        The raw XML of the paper entries from PubMed database
+
+    Yields
+    ------
+    etree._Element
+        a paper entry (PubmedArticle element)
+    """
+
+    for _, paper_entry in etree.iterparse(
+        BytesIO(content), events=("end",), tag="PubmedArticle", resolve_entities=False, no_network=True
+    ):
+        yield paper_entry
+
+        paper_entry.clear()
+        while paper_entry.getprevious() is not None:
+            del paper_entry.getparent()[0]
+
+
+def _get_publication(paper_entry: etree._Element) -> Publication:
     """
     Using a paper entry provided, this method builds a publication instance
 
     Parameters
     ----------
-    paper_entry : dict
+    paper_entry : etree._Element
         A paper entry retrieved from PubMed API
 
     Returns
@@ -121,14 +235,14 @@ def _get_publication(paper_entry: dict) -> Publication:
         A publication instance
     """
 
-    article = paper_entry.get("MedlineCitation").get("Article")
-
-    publication_title = article.get("Journal").get("Title")
+    publication_titles = PUBLICATION_TITLE_XPATH(paper_entry)
+    publication_title = publication_titles[0] if len(publication_titles) > 0 else None
 
     if publication_title is None or len(publication_title) == 0:
         return None
 
-    publication_issn = article.get("Journal").get("ISSN").get("#text")
+    publication_issns = PUBLICATION_ISSN_XPATH(paper_entry)
+    publication_issn = publication_issns[0] if len(publication_issns) > 0 else None
 
     publication = Publication(
         publication_title, None, publication_issn, None, "Journal"
@@ -137,44 +251,33 @@ def _get_publication(paper_entry: dict) -> Publication:
     return publication
 
 
-def _get_text_recursively(text_entry) -> str:
+def _get_text(element: etree._Element) -> str:
     """
-    Get the text given a arbitrary object
+    Get the whole text of an element, including the text of its children (e.g. <i>, <sup>)
 
     Parameters
     ----------
-    text_entry : any
-        A arbitrary object that contains some text
+    element : etree._Element
+        An element that contains some text
 
     Returns
     -------
     str
         The extracted text
     """
-    if text_entry is None:
+    if element is None:
         return ""
-    if type(text_entry) == str:
-        return text_entry
-    else:
-        text = []
-        items = (
-            text_entry
-            if type(text_entry) == list
-            else [x for k, x in text_entry.items()]
-        )
-        for item in items:
-            text.append(_get_text_recursively(item))
-        return " ".join(text)
+    return "".join(element.itertext())
 
 
-def _get_paper(paper_entry: dict, publication: Publication) -> Paper:
+def _get_paper(paper_entry: etree._Element, publication: Publication) -> Paper:
     """
     Using a paper entry provided, this method builds a paper instance
 
     Parameters
     ----------
-    paper_entry : dict
-        A paper entry retrieved from IEEE API
+    paper_entry : etree._Element
+        A paper entry retrieved from PubMed API
     publication : Publication
         A publication instance that will be associated with the paper
 
@@ -184,56 +287,41 @@ def _get_paper(paper_entry: dict, publication: Publication) -> Paper:
         A paper instance or None
     """
 
-    article = paper_entry.get("MedlineCitation").get("Article")
-
-    paper_title = _get_text_recursively(article.get("ArticleTitle", None))
+    paper_title = PAPER_TITLE_XPATH(paper_entry)
 
     if paper_title is None or len(paper_title) == 0:
         return None
 
-    if "ArticleDate" in article:
-        paper_publication_date_day = article.get("ArticleDate").get("Day")
-        paper_publication_date_month = article.get("ArticleDate").get("Month")
-        paper_publication_date_year = article.get("ArticleDate").get("Year")
-    else:
+    article_dates = PAPER_ARTICLE_DATE_XPATH(paper_entry)
+    journal_pub_dates = PAPER_JOURNAL_PUB_DATE_XPATH(paper_entry)
+    if len(article_dates) > 0:
+        paper_publication_date_day = article_dates[0].findtext("Day")
+        paper_publication_date_month = article_dates[0].findtext("Month")
+        paper_publication_date_year = article_dates[0].findtext("Year")
+    elif len(journal_pub_dates) > 0:
         paper_publication_date_day = 1
         paper_publication_date_month = common_util.get_numeric_month_by_string(
-            article.get("Journal").get("JournalIssue").get("PubDate").get("Month")
-        )
-        paper_publication_date_year = (
-            article.get("Journal").get("JournalIssue").get("PubDate").get("Year")
+            journal_pub_dates[0].findtext("Month")
         )
+        paper_publication_date_year = journal_pub_dates[0].findtext("Year")
+    else:
+        return None
 
-    paper_doi = None
-    paper_ids = paper_entry.get("PubmedData").get("ArticleIdList").get("ArticleId")
-    for paper_id in paper_ids:
-        if type(paper_id) == dict and paper_id.get("@IdType", None) == "doi":
-            paper_doi = paper_id.get("#text")
-            break
+    paper_dois = PAPER_DOI_XPATH(paper_entry)
+    paper_doi = paper_dois[0] if len(paper_dois) > 0 else None
 
-    paper_abstract = None
-    paper_abstract_entry = article.get("Abstract", {}).get("AbstractText", None)
-    if paper_abstract_entry is None:
+    paper_abstract_entries = PAPER_ABSTRACT_XPATH(paper_entry)
+    if len(paper_abstract_entries) == 0:
         raise ValueError("Paper abstract is empty")
 
-    if isinstance(paper_abstract_entry, list):
-        paper_abstract = "\n".join(
-            [_get_text_recursively(x) for x in paper_abstract_entry]
-        )
-    else:
-        paper_abstract = _get_text_recursively(paper_abstract_entry)
+    paper_abstract = "\n".join([_get_text(x) for x in paper_abstract_entries])
 
-    try:
-        paper_keywords = set(
-            [
-                _get_text_recursively(x).strip()
-                for x in paper_entry.get("MedlineCitation")
-                .get("KeywordList")
-                .get("Keyword")
-            ]
-        )
-    except Exception:
-        paper_keywords = set()
+    paper_keywords = set(
+        [
+            _get_text(x).strip()
+            for x in PAPER_KEYWORDS_XPATH(paper_entry)
+        ]
+    )
 
     paper_publication_date = None
     try:
@@ -252,22 +340,16 @@ def _get_paper(paper_entry: dict, publication: Publication) -> Paper:
         return None
 
     paper_authors = []
-    retrived_authors = []
-    if isinstance(article.get("AuthorList").get("Author"), dict):  # only one author
-        retrived_authors = [article.get("AuthorList").get("Author")]
-    else:
-        retrived_authors = article.get("AuthorList").get("Author")
-
-    for author in retrived_authors:
-        if isinstance(author, str):
-            paper_authors.append(author)
-        elif isinstance(author, dict):
-            paper_authors.append(f"{author.get('ForeName')} {author.get('LastName')}")
+    for author in PAPER_AUTHORS_XPATH(paper_entry):
+        if author.find("LastName") is not None:
+            paper_authors.append(f"{author.findtext('ForeName')} {author.findtext('LastName')}")
+        else:  # e.g., collective names
+            paper_authors.append(_get_text(author).strip())
 
     paper_pages = None
     paper_number_of_pages = None
     try:
-        paper_pages = article.get("Pagination").get("MedlinePgn")
+        paper_pages = PAPER_PAGES_XPATH(paper_entry)[0]
         if (
             not paper_pages.isdigit()
         ):  # if it's a digit, the paper pages range is invalid
@@ -321,51 +403,90 @@ def run(search: Search):
         )
         return
 
+    if search.reached_its_limit(DATABASE_LABEL):  # no need to request anything
+        return
+
     papers_count = 0
     result = _get_api_result(search)
 
-    if result.get("eSearchResult").get("ErrorList", None) is not None:
+    if result.find("ErrorList") is not None:
         total_papers = 0
     else:
-        total_papers = int(result.get("eSearchResult").get("Count"))
+        total_papers = int(result.findtext("Count"))
 
     logging.info(f"PubMed: {total_papers} papers to fetch")
 
-    while papers_count < total_papers and not search.reached_its_limit(DATABASE_LABEL):
-        pubmid_ids = result.get("eSearchResult").get("IdList").get("Id")
-        paper_entries = _get_paper_entry(pubmid_ids)
-        logging.debug(paper_entries)
-
-        for paper_entry in paper_entries.get("PubmedArticleSet").get("PubmedArticle"):
-            if papers_count >= total_papers or search.reached_its_limit(DATABASE_LABEL):
-                break
-
-            papers_count += 1
-
-            try:
-                if paper_entry is not None:
-                    paper_title = (
-                        paper_entry.get("MedlineCitation")
-                        .get("Article")
-                        .get("ArticleTitle")
-                    )
-
-                    paper_title = _get_text_recursively(paper_title)
-
-                    logging.info(
-                        f"({papers_count}/{total_papers}) Fetching PubMed paper: {paper_title}"
-                    )
-
-                    publication = _get_publication(paper_entry)
-                    paper = _get_paper(paper_entry, publication)
+    if total_papers == 0:
+        return
 
-                    if paper is not None:
-                        paper.add_database(DATABASE_LABEL)
-                        search.add_paper(paper)
+    # the search limits may need fewer papers than the total, so we don't prefetch pages that we won't use
+    expected_papers = total_papers
+    if search.limit is not None:
+        expected_papers = min(expected_papers, search.limit - len(search.papers))
+    if search.limit_per_database is not None:
+        expected_papers = min(
+            expected_papers,
+            search.limit_per_database - len(search.papers_by_database.get(DATABASE_LABEL, [])),
+        )
 
-            except Exception as e:  # pragma: no cover
-                logging.debug(e, exc_info=True)
-                raise e
+    if expected_papers <= 0:
+        return
 
-        if papers_count < total_papers and not search.reached_its_limit(DATABASE_LABEL):
-            result = _get_api_result(search, papers_count)
+    expected_pages = math.ceil(expected_papers / MAX_ENTRIES_PER_PAGE)
+
+    # the first page IDs are already known, the next expected pages are prefetched concurrently.
+    # Note: cancelling the remaining futures only drops the queued pages, so when the run stops earlier than expected
+    # (or a page fetching fails) we still wait for the pages being fetched at that moment and discard them
+    next_start_records = iter(range(MAX_ENTRIES_PER_PAGE, total_papers, MAX_ENTRIES_PER_PAGE))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+        pubmid_ids = [x.text for x in result.findall("IdList/Id")]
+        futures = collections.deque([executor.submit(_get_paper_entry, pubmid_ids)])
+        submitted_pages = 1
+
+        # the search limit can only be reached when a paper is added, so there's no need to check it for every entry
+        reached_its_limit = False
+
+        try:
+            while papers_count < total_papers and not reached_its_limit:
+                # keeping the expected pages in flight, or fetching one more page when we run out of them
+                # (some entries may not be valid papers, or may be merged with papers from other databases)
+                while len(futures) < MAX_CONCURRENT_REQUESTS and (
+                    submitted_pages < expected_pages or len(futures) == 0
+                ):
+                    start_record = next(next_start_records, None)
+                    if start_record is None:
+                        break
+                    futures.append(executor.submit(_get_paper_entries_page, search, start_record))
+                    submitted_pages += 1
+
+                if len(futures) == 0:
+                    break
+
+                paper_entries = futures.popleft().result()
+
+                for paper_entry in _get_paper_entries(paper_entries):
+                    if papers_count >= total_papers or reached_its_limit:
+                        break
+
+                    papers_count += 1
+
+                    try:
+                        publication = _get_publication(paper_entry)
+                        paper = _get_paper(paper_entry, publication)
+
+                        if paper is not None:
+                            logging.info(
+                                f"({papers_count}/{total_papers}) Fetching PubMed paper: {paper.title}"
+                            )
+
+                            paper.add_database(DATABASE_LABEL)
+                            search.add_paper(paper)
+                            reached_its_limit = search.reached_its_limit(DATABASE_LABEL)
+
+                    except Exception as e:  # pragma: no cover
+                        logging.debug(e, exc_info=True)
+                        raise e
+        finally:
+            for future in futures:  # the pages that we don't need anymore
+                future.cancel()
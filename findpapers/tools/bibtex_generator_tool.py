@@ -33,84 +33,83 @@ def generate_bibtex(search_path: str, outputpath: str, only_selected_papers: Opt
     common_util.check_write_access(outputpath)
 
     default_tab = ' ' * 4
-    bibtex_output = ''
-
-    if add_findpapers_citation:
-        bibtex_output = '\n'.join([
-            '@misc{grosman2020findpapers',
-            '\ttitle = {Findpapers},',
-            '\tauthor = {Grosman, Jonatas},',
-            '\tpublisher = {GitHub},',
-            '\tjournal = {GitHub repository},',
-            '\thowpublished = {\\url{https://github.com/jonatasgrosman/findpapers}},',
-            '\tyear = {2020}',
-            '}\n\n'
-        ])
-
-    for paper in search.papers:
-
-        if (only_selected_papers and not paper.selected) or \
-        (categories_filter is not None and (paper.categories is None or not paper.has_category_match(categories_filter))):
-            continue
-
-        logging.info(f'Exporting bibtex for: {paper.title}')
-
-        try:
-
-            citation_type = '@unpublished'
-            if paper.publication is not None:
-                if paper.publication.category == 'Journal':
-                    citation_type = '@article'
-                elif paper.publication.category == 'Conference Proceedings':
-                    citation_type = '@inproceedings'
-                elif paper.publication.category == 'Book':
-                    citation_type = '@book'
-                else:
-                    citation_type = '@misc'
-
-            bibtex_output += f'{citation_type}{"{"}{paper.get_citation_key()},\n'
-
-            bibtex_output += f'{default_tab}title = {{{paper.title}}},\n'
-
-            if len(paper.authors) > 0:
-                authors = ' and '.join(paper.authors)
-                bibtex_output += f'{default_tab}author = {{{authors}}},\n'
-
-            if citation_type == '@unpublished':
-                note = ''
-                if len(paper.urls) > 0:
-                    note += f'Available at {list(paper.urls)[0]}'
-                if paper.publication_date is not None:
-                    note += f' ({paper.publication_date.strftime("%Y/%m/%d")})'
-                if paper.comments is not None:
-                    note += paper.comments if len(
-                        note) == 0 else f' | {paper.comments}'
-                bibtex_output += f'{default_tab}note = {{{note}}},\n'
-            elif citation_type == '@article':
-                bibtex_output += f'{default_tab}journal = {{{paper.publication.title}}},\n'
-            elif citation_type == '@inproceedings':
-                bibtex_output += f'{default_tab}booktitle = {{{paper.publication.title}}},\n'
-            elif citation_type == '@misc' and len(paper.urls) > 0 and paper.publication_date is not None:
-                date = paper.publication_date.strftime('%Y/%m/%d')
-                url = list(paper.urls)[0]
-                bibtex_output += f'{default_tab}howpublished = {{Available at {url} ({date})}},\n'
-
-            if paper.publication is not None and paper.publication.publisher is not None:
-                bibtex_output += f'{default_tab}publisher = {{{paper.publication.publisher}}},\n'
 
-            if paper.publication_date is not None:
-                bibtex_output += f'{default_tab}year = {{{paper.publication_date.year}}},\n'
+    with open(outputpath, 'w') as fp:
 
-            if paper.pages is not None:
-                bibtex_output += f'{default_tab}pages = {{{paper.pages}}},\n'
+        if add_findpapers_citation:
+            fp.write('\n'.join([
+                '@misc{grosman2020findpapers',
+                '\ttitle = {Findpapers},',
+                '\tauthor = {Grosman, Jonatas},',
+                '\tpublisher = {GitHub},',
+                '\tjournal = {GitHub repository},',
+                '\thowpublished = {\\url{https://github.com/jonatasgrosman/findpapers}},',
+                '\tyear = {2020}',
+                '}\n\n'
+            ]))
+
+        for paper in search.papers:
+
+            if (only_selected_papers and not paper.selected) or \
+            (categories_filter is not None and (paper.categories is None or not paper.has_category_match(categories_filter))):
+                continue
+
+            logging.info(f'Exporting bibtex for: {paper.title}')
+
+            try:
+
+                citation_type = '@unpublished'
+                if paper.publication is not None:
+                    if paper.publication.category == 'Journal':
+                        citation_type = '@article'
+                    elif paper.publication.category == 'Conference Proceedings':
+                        citation_type = '@inproceedings'
+                    elif paper.publication.category == 'Book':
+                        citation_type = '@book'
+                    else:
+                        citation_type = '@misc'
+
+                # each entry is built on its own and written at once, so a failing paper
+                # won't leave a partial entry behind
+                fields = []
+
+                fields.append(f'{default_tab}title = {{{paper.title}}}')
+
+                if len(paper.authors) > 0:
+                    authors = ' and '.join(paper.authors)
+                    fields.append(f'{default_tab}author = {{{authors}}}')
+
+                if citation_type == '@unpublished':
+                    note = ''
+                    if len(paper.urls) > 0:
+                        note += f'Available at {list(paper.urls)[0]}'
+                    if paper.publication_date is not None:
+                        note += f' ({paper.publication_date.strftime("%Y/%m/%d")})'
+                    if paper.comments is not None:
+                        note += paper.comments if len(
+                            note) == 0 else f' | {paper.comments}'
+                    fields.append(f'{default_tab}note = {{{note}}}')
+                elif citation_type == '@article':
+                    fields.append(f'{default_tab}journal = {{{paper.publication.title}}}')
+                elif citation_type == '@inproceedings':
+                    fields.append(f'{default_tab}booktitle = {{{paper.publication.title}}}')
+                elif citation_type == '@misc' and len(paper.urls) > 0 and paper.publication_date is not None:
+                    date = paper.publication_date.strftime('%Y/%m/%d')
+                    url = list(paper.urls)[0]
+                    fields.append(f'{default_tab}howpublished = {{Available at {url} ({date})}}')
+
+                if paper.publication is not None and paper.publication.publisher is not None:
+                    fields.append(f'{default_tab}publisher = {{{paper.publication.publisher}}}')
 
-            bibtex_output = bibtex_output.rstrip(
-                ',\n') + '\n'  # removing last comma
+                if paper.publication_date is not None:
+                    fields.append(f'{default_tab}year = {{{paper.publication_date.year}}}')
 
-            bibtex_output += '}\n\n'
+                if paper.pages is not None:
+                    fields.append(f'{default_tab}pages = {{{paper.pages}}}')
 
-        except Exception as e:
-            logging.debug(e, exc_info=True)
+                fp.write(f'{citation_type}{"{"}{paper.get_citation_key()},\n')
+                fp.write(',\n'.join(fields))
+                fp.write('\n}\n\n')
 
-    with open(outputpath, 'w') as fp:
-        fp.write(bibtex_output)
+            except Exception as e:
+                logging.debug(e, exc_info=True)
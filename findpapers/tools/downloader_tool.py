@@ -5,37 +5,242 @@ import requests
 import logging
 import datetime
 import urllib.parse
+import threading
+import concurrent.futures
 from findpapers.models.paper import Paper
 from lxml import html
-from typing import Optional, List
+from typing import Optional, List, Tuple
 import findpapers.utils.common_util as common_util
 import findpapers.utils.persistence_util as persistence_util
 from findpapers.models.search import Search
 from findpapers.utils.requests_util import DefaultSession
 
 
+FILENAME_SANITIZER_REGEX = re.compile(r"[^\w-]")
+MAX_CONCURRENT_REQUESTS_PER_HOST = 4  # the papers are downloaded concurrently, but we don't wanna be blocked by publishers
+
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+
+def _get_host_semaphore(url: str) -> threading.BoundedSemaphore:
+    """
+    Get the semaphore that limits the number of concurrent requests to the host of the provided URL
+
+    Parameters
+    ----------
+    url : str
+        A URL
+
+    Returns
+    -------
+    threading.BoundedSemaphore
+        The semaphore of the URL host
+    """
+    host = urllib.parse.urlsplit(url).hostname
+    with _host_semaphores_lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(
+                MAX_CONCURRENT_REQUESTS_PER_HOST
+            )
+        return _host_semaphores[host]
+
+
+_output_filepath_locks = {}
+_output_filepath_locks_lock = threading.Lock()
+
+
+def _get_output_filepath_lock(output_filepath: str) -> threading.Lock:
+    """
+    Get the lock that prevents two papers from being downloaded to the same output filepath at the same time
+    (e.g. papers with the same publication year and title)
+
+    Parameters
+    ----------
+    output_filepath : str
+        An output filepath
+
+    Returns
+    -------
+    threading.Lock
+        The lock of the output filepath
+    """
+    output_filepath = os.path.abspath(output_filepath)
+    with _output_filepath_locks_lock:
+        if output_filepath not in _output_filepath_locks:
+            _output_filepath_locks[output_filepath] = threading.Lock()
+        return _output_filepath_locks[output_filepath]
+
+
 def get_default_filebasename(paper: Paper) -> str:
     filename = f"{paper.publication_date.year}-{paper.title}"
-    filename = re.sub(r"[^\w\d-]", "_", filename)  # sanitize filename
+    filename = FILENAME_SANITIZER_REGEX.sub("_", filename)  # sanitize filename
     return filename
 
 
-def find_pdf_url(paper: Paper) -> Optional[str]:
+# The functions below build the PDF URL of a paper given the (HTML) page of a publisher,
+# they return None when the PDF URL cannot be inferred
+
+
+def _get_acm_pdf_url(response, response_url_path: str, response_query_string: dict, paper: Paper) -> Optional[str]:
+    doi = paper.doi
+    if (
+        doi is None
+        and response_url_path.startswith("/doi/")
+        and "/doi/pdf/" not in response_url_path
+    ):
+        doi = response_url_path[4:]
+    elif doi is None:
+        return None
+
+    return f"https://dl.acm.org/doi/pdf/{doi}"
+
+
+def _get_ieee_pdf_url(response, response_url_path: str, response_query_string: dict, paper: Paper) -> Optional[str]:
+    if response_url_path.startswith("/document/"):
+        document_id = response_url_path[10:]
+    elif response_query_string.get("arnumber", None) is not None:
+        document_id = response_query_string.get("arnumber")[0]
+    else:
+        return None
+
+    return f"https://ieeexplore.ieee.org/stampPDF/getPDF.jsp?tp=&arnumber={document_id}"
+
+
+def _get_sciencedirect_pdf_url(response, response_url_path: str, response_query_string: dict, paper: Paper) -> Optional[str]:
+    paper_id = response_url_path.split("/")[-1]
+    return f"https://www.sciencedirect.com/science/article/pii/{paper_id}/pdfft?isDTMRedir=true&download=true"
+
+
+def _get_rsc_pdf_url(response, response_url_path: str, response_query_string: dict, paper: Paper) -> Optional[str]:
+    return response.url.replace("/articlelanding/", "/articlepdf/")
+
+
+def _get_full_to_pdf_url(response, response_url_path: str, response_query_string: dict, paper: Paper) -> Optional[str]:
+    return response.url.replace("/full", "/pdf")
+
+
+def _get_doi_to_doi_pdf_url(response, response_url_path: str, response_query_string: dict, paper: Paper) -> Optional[str]:
+    return response.url.replace("/doi", "/doi/pdf")
+
+
+def _get_springer_pdf_url(response, response_url_path: str, response_query_string: dict, paper: Paper) -> Optional[str]:
+    return (
+        response.url.replace("/article/", "/content/pdf/").replace("%2F", "/")
+        + ".pdf"
+    )
+
+
+def _get_isca_pdf_url(response, response_url_path: str, response_query_string: dict, paper: Paper) -> Optional[str]:
+    return response.url.replace("/abstracts/", "/pdfs/").replace(".html", ".pdf")
+
+
+def _get_wiley_pdf_url(response, response_url_path: str, response_query_string: dict, paper: Paper) -> Optional[str]:
+    return response.url.replace("/full/", "/pdfdirect/").replace(
+        "/abs/", "/pdfdirect/"
+    )
+
+
+def _get_pdf_suffix_pdf_url(response, response_url_path: str, response_query_string: dict, paper: Paper) -> Optional[str]:
+    return response.url + "/pdf"
+
+
+def _get_pnas_pdf_url(response, response_url_path: str, response_query_string: dict, paper: Paper) -> Optional[str]:
+    return response.url.replace("/content/", "/content/pnas/") + ".full.pdf"
+
+
+def _get_jneurosci_pdf_url(response, response_url_path: str, response_query_string: dict, paper: Paper) -> Optional[str]:
+    return response.url.replace("/content/", "/content/jneuro/") + ".full.pdf"
+
+
+def _get_ijcai_pdf_url(response, response_url_path: str, response_query_string: dict, paper: Paper) -> Optional[str]:
+    paper_id = response.url.split("/")[-1].zfill(4)
+    return "/".join(response.url.split("/")[:-1]) + "/" + paper_id + ".pdf"
+
+
+def _get_springeropen_pdf_url(response, response_url_path: str, response_query_string: dict, paper: Paper) -> Optional[str]:
+    return response.url.replace("/articles/", "/track/pdf/")
+
+
+PDF_URL_HANDLER_BY_HOST = {
+    "https://dl.acm.org": _get_acm_pdf_url,
+    "https://ieeexplore.ieee.org": _get_ieee_pdf_url,
+    "https://www.sciencedirect.com": _get_sciencedirect_pdf_url,
+    "https://linkinghub.elsevier.com": _get_sciencedirect_pdf_url,
+    "https://pubs.rsc.org": _get_rsc_pdf_url,
+    "https://www.tandfonline.com": _get_full_to_pdf_url,
+    "https://www.frontiersin.org": _get_full_to_pdf_url,
+    "https://pubs.acs.org": _get_doi_to_doi_pdf_url,
+    "https://journals.sagepub.com": _get_doi_to_doi_pdf_url,
+    "https://royalsocietypublishing.org": _get_doi_to_doi_pdf_url,
+    "https://link.springer.com": _get_springer_pdf_url,
+    "https://www.isca-speech.org": _get_isca_pdf_url,
+    "https://onlinelibrary.wiley.com": _get_wiley_pdf_url,
+    "https://www.jmir.org": _get_pdf_suffix_pdf_url,
+    "https://www.mdpi.com": _get_pdf_suffix_pdf_url,
+    "https://www.pnas.org": _get_pnas_pdf_url,
+    "https://www.jneurosci.org": _get_jneurosci_pdf_url,
+    "https://www.ijcai.org": _get_ijcai_pdf_url,
+    "https://asmp-eurasipjournals.springeropen.com": _get_springeropen_pdf_url,
+}
+
+
+def _close_response(response: Optional[requests.Response]):
+    """
+    Close a response, releasing its connection. The blank responses that DefaultSession builds
+    when a request fails don't have an underlying connection, so there's nothing to close on them
+
+    Parameters
+    ----------
+    response : Optional[requests.Response]
+        A response instance or None
+    """
+    if response is not None and response.raw is not None:
+        response.close()
+
+
+def _find_pdf(paper: Paper) -> Tuple[Optional[str], Optional[requests.Response]]:
+    """
+    Find the PDF URL of a paper using its URLs. Each URL is fetched with a single streamed GET request,
+    so when it already leads to the PDF file, the still open response is returned too
+    and the file can be downloaded without requesting it again
+
+    Parameters
+    ----------
+    paper : Paper
+        A paper instance
+
+    Returns
+    -------
+    Tuple[Optional[str], Optional[requests.Response]]
+        The PDF URL (or None) and the open PDF response when the PDF file was reached (or None)
+    """
     pdf_url = None
     for (
         url
     ) in paper.urls:  # we'll try to download the PDF file of the paper by its URLs
+        response = None
         try:
             logging.info(f"Fetching data from: {url}")
 
-            response = common_util.try_success(
-                lambda url=url: DefaultSession().head(url, allow_redirects=True), 2
-            )
+            with _get_host_semaphore(url):
+                response = common_util.try_success(
+                    lambda url=url: DefaultSession().get(
+                        url, stream=True, allow_redirects=True
+                    ),
+                    2,
+                )
 
             if response is None:
                 continue
 
-            if "text/html" in response.headers.get("content-type").lower():
+            content_type = response.headers.get("content-type", "").lower()
+
+            if "application/pdf" in content_type:
+                pdf_response, response = response, None  # kept open for the download
+                return pdf_response.url, pdf_response
+
+            if "text/html" in content_type:
                 response_url = urllib.parse.urlsplit(response.url)
                 response_query_string = urllib.parse.parse_qs(
                     urllib.parse.urlparse(response.url).query
@@ -49,105 +254,26 @@ def find_pdf_url(paper: Paper) -> Optional[str]:
 
                 response_url_path = response_url_path.split("?")[0]
 
-                if host_url in ["https://dl.acm.org"]:
-                    doi = paper.doi
-                    if (
-                        doi is None
-                        and response_url_path.startswith("/doi/")
-                        and "/doi/pdf/" not in response_url_path
-                    ):
-                        doi = response_url_path[4:]
-                    elif doi is None:
-                        continue
-
-                    pdf_url = f"https://dl.acm.org/doi/pdf/{doi}"
-
-                elif host_url in ["https://ieeexplore.ieee.org"]:
-                    if response_url_path.startswith("/document/"):
-                        document_id = response_url_path[10:]
-                    elif response_query_string.get("arnumber", None) is not None:
-                        document_id = response_query_string.get("arnumber")[0]
-                    else:
-                        continue
-
-                    pdf_url = (
-                        f"{host_url}/stampPDF/getPDF.jsp?tp=&arnumber={document_id}"
-                    )
-
-                elif host_url in [
-                    "https://www.sciencedirect.com",
-                    "https://linkinghub.elsevier.com",
-                ]:
-                    paper_id = response_url_path.split("/")[-1]
-                    pdf_url = f"https://www.sciencedirect.com/science/article/pii/{paper_id}/pdfft?isDTMRedir=true&download=true"
-
-                elif host_url in ["https://pubs.rsc.org"]:
-                    pdf_url = response.url.replace("/articlelanding/", "/articlepdf/")
-
-                elif host_url in [
-                    "https://www.tandfonline.com",
-                    "https://www.frontiersin.org",
-                ]:
-                    pdf_url = response.url.replace("/full", "/pdf")
-
-                elif host_url in [
-                    "https://pubs.acs.org",
-                    "https://journals.sagepub.com",
-                    "https://royalsocietypublishing.org",
-                ]:
-                    pdf_url = response.url.replace("/doi", "/doi/pdf")
-
-                elif host_url in ["https://link.springer.com"]:
-                    pdf_url = (
-                        response.url.replace("/article/", "/content/pdf/").replace(
-                            "%2F", "/"
-                        )
-                        + ".pdf"
-                    )
-
-                elif host_url in ["https://www.isca-speech.org"]:
-                    pdf_url = response.url.replace("/abstracts/", "/pdfs/").replace(
-                        ".html", ".pdf"
+                handler = PDF_URL_HANDLER_BY_HOST.get(host_url)
+                if handler is not None:
+                    pdf_url = handler(
+                        response, response_url_path, response_query_string, paper
                     )
 
-                elif host_url in ["https://onlinelibrary.wiley.com"]:
-                    pdf_url = response.url.replace("/full/", "/pdfdirect/").replace(
-                        "/abs/", "/pdfdirect/"
-                    )
-
-                elif host_url in ["https://www.jmir.org", "https://www.mdpi.com"]:
-                    pdf_url = response.url + "/pdf"
-
-                elif host_url in ["https://www.pnas.org"]:
-                    pdf_url = (
-                        response.url.replace("/content/", "/content/pnas/")
-                        + ".full.pdf"
-                    )
-
-                elif host_url in ["https://www.jneurosci.org"]:
-                    pdf_url = (
-                        response.url.replace("/content/", "/content/jneuro/")
-                        + ".full.pdf"
-                    )
-
-                elif host_url in ["https://www.ijcai.org"]:
-                    paper_id = response.url.split("/")[-1].zfill(4)
-                    pdf_url = (
-                        "/".join(response.url.split("/")[:-1]) + "/" + paper_id + ".pdf"
-                    )
-
-                elif host_url in ["https://asmp-eurasipjournals.springeropen.com"]:
-                    pdf_url = response.url.replace("/articles/", "/track/pdf/")
-
-            elif "application/pdf" in response.headers.get("content-type").lower():
-                pdf_url = response.url
-
         except Exception as e:  # pragma: no cover
             logging.debug(e, exc_info=True)
+        finally:
+            _close_response(response)  # we don't need the page content
 
         if pdf_url is not None:
             break
 
+    return pdf_url, None
+
+
+def find_pdf_url(paper: Paper) -> Optional[str]:
+    pdf_url, response = _find_pdf(paper)
+    _close_response(response)
     return pdf_url
 
 
@@ -175,24 +301,42 @@ def download_paper(paper: Paper, output_directory: str, output_filename=None) ->
 
     output_filepath = os.path.join(output_directory, output_filename)
 
-    if os.path.exists(output_filepath):  # PDF already collected
-        logging.info(f"Paper's PDF file has already been collected")
-        return output_filepath
-
-    if paper.pdf_url is None:
-        paper.pdf_url = find_pdf_url(paper)
-
-    if paper.pdf_url is not None:
-        response = common_util.try_success(
-            lambda url=paper.pdf_url: DefaultSession().get(url), 2
-        )
-        if "application/pdf" in response.headers.get("content-type").lower():
-            with open(output_filepath, "wb") as fp:
-                fp.write(response.content)
-        return output_filepath
-    else:
-        logging.info(f"Paper's PDF file cannot be collected")
-        return None
+    # the papers are downloaded concurrently, so the filepath is locked until the PDF is completely written,
+    # papers that share it will wait and then find the PDF already collected (or try their own URLs)
+    with _get_output_filepath_lock(output_filepath):
+        if os.path.exists(output_filepath):  # PDF already collected
+            logging.info(f"Paper's PDF file has already been collected")
+            return output_filepath
+
+        response = None
+        if paper.pdf_url is None:
+            paper.pdf_url, response = _find_pdf(paper)
+
+        if paper.pdf_url is not None:
+            with _get_host_semaphore(paper.pdf_url):
+                if response is None:
+                    response = common_util.try_success(
+                        lambda url=paper.pdf_url: DefaultSession().get(url, stream=True), 2
+                    )
+                try:
+                    if (
+                        response is not None
+                        and "application/pdf" in response.headers.get("content-type", "").lower()
+                    ):
+                        try:
+                            with open(output_filepath, "wb") as fp:
+                                for chunk in response.iter_content(chunk_size=64 * 1024):
+                                    fp.write(chunk)
+                        except Exception:
+                            if os.path.exists(output_filepath):  # don't keep a partial PDF file
+                                os.remove(output_filepath)
+                            raise
+                finally:
+                    _close_response(response)
+            return output_filepath
+        else:
+            logging.info(f"Paper's PDF file cannot be collected")
+            return None
 
 
 def download(
@@ -254,30 +398,51 @@ def download(
             f"------- A new download process started at: {datetime.datetime.strftime(now, '%Y-%m-%d %H:%M:%S')} \n"
         )
 
-    for i, paper in enumerate(search.papers):
-        logging.info(f"({i+1}/{len(search.papers)}) {paper.title}")
-
-        if (only_selected_papers and not paper.selected) or (
-            categories_filter is not None
-            and (
-                paper.categories is None
-                or not paper.has_category_match(categories_filter)
+    papers = [
+        paper
+        for paper in search.papers
+        if not (
+            (only_selected_papers and not paper.selected)
+            or (
+                categories_filter is not None
+                and (
+                    paper.categories is None
+                    or not paper.has_category_match(categories_filter)
+                )
             )
-        ):
-            continue
-
-        output_filepath = download_paper(paper, output_directory)
-        downloaded = output_filepath is not None
+        )
+    ]
 
-        if downloaded:
-            paper.file_path = output_filepath
-            with open(log_filepath, "a") as fp:
-                fp.write(f"[DOWNLOADED] {paper.title}\n")
-        else:
-            with open(log_filepath, "a") as fp:
-                fp.write(f"[FAILED] {paper.title}\n")
-                if len(paper.urls) == 0:
-                    fp.write(f"Empty URL list\n")
-                else:
-                    for url in paper.urls:
-                        fp.write(f"{url}\n")
+    def _do_work(paper: Paper) -> Optional[str]:
+        try:
+            return download_paper(paper, output_directory)
+        except Exception as e:  # pragma: no cover
+            logging.debug(e, exc_info=True)
+            return None
+
+    # the downloads are I/O bound, so we do them concurrently,
+    # but the results are logged here to avoid messing the log file up
+    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+        futures = {}
+        for paper in papers:
+            futures[executor.submit(_do_work, paper)] = paper
+
+        for i, future in enumerate(concurrent.futures.as_completed(futures)):
+            paper = futures.get(future)
+            logging.info(f"({i+1}/{len(papers)}) {paper.title}")
+
+            output_filepath = future.result()
+            downloaded = output_filepath is not None
+
+            if downloaded:
+                paper.file_path = output_filepath
+                with open(log_filepath, "a") as fp:
+                    fp.write(f"[DOWNLOADED] {paper.title}\n")
+            else:
+                with open(log_filepath, "a") as fp:
+                    fp.write(f"[FAILED] {paper.title}\n")
+                    if len(paper.urls) == 0:
+                        fp.write(f"Empty URL list\n")
+                    else:
+                        for url in paper.urls:
+                            fp.write(f"{url}\n")
@@ -139,3 +139,36 @@ class ThreadSafeSingletonMetaclass(type):
                 if cls not in cls._instances:
                     cls._instances[cls] = super(ThreadSafeSingletonMetaclass, cls).__call__(*args, **kwargs)
         return cls._instances[cls]
+
+
+class RequestThrottle():
+
+    """
+    Thread-safe throttle that keeps a minimum interval between the start of consecutive requests,
+    it's useful to respect the rate limit of an API that is called from many threads
+    """
+
+    def __init__(self, min_interval: float):
+        """
+        Parameters
+        ----------
+        min_interval : float
+            The minimum interval between the start of consecutive requests in seconds
+        """
+
+        self.min_interval = min_interval
+        self._next_request_time = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """
+        Block the calling thread until it can start its request
+        """
+
+        with self._lock:  # reserving a request slot
+            now = time.monotonic()
+            delay = self._next_request_time - now
+            self._next_request_time = max(now, self._next_request_time) + self.min_interval
+
+        if delay > 0:
+            time.sleep(delay)
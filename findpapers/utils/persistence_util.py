@@ -1,4 +1,4 @@
-import json
+import orjson
 import re
 from typing import Optional
 from findpapers.models.search import Search
@@ -16,8 +16,8 @@ def save(search: Search, outputpath: str):
         A valid file path used to save the search results
     """
 
-    with open(outputpath, 'w') as jsonfile:
-        json.dump(Search.to_dict(search), jsonfile, indent=2, sort_keys=True)
+    with open(outputpath, 'wb') as jsonfile:
+        jsonfile.write(orjson.dumps(Search.to_dict(search), option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
 
 
 def load(search_path: str):
@@ -30,5 +30,5 @@ def load(search_path: str):
         A valid file path containing a JSON representation of the search results
     """
 
-    with open(search_path, 'r') as jsonfile:
-        return Search.from_dict(json.load(jsonfile))
+    with open(search_path, 'rb') as jsonfile:
+        return Search.from_dict(orjson.loads(jsonfile.read()))
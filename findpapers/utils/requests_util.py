@@ -115,6 +115,12 @@ class DefaultSession(requests.Session, metaclass=common_util.ThreadSafeSingleton
         self.headers.update({'User-Agent': random.choice(USER_AGENTS)})
         self.default_timeout = 20
 
+        # this session is shared by concurrent requests (e.g., paper downloads, PubMed pages),
+        # so we need a connection pool big enough to keep their connections alive for reuse
+        adapter = requests.adapters.HTTPAdapter(pool_connections=64, pool_maxsize=64)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
     def request(self, method, url, **kwargs):
         """
         This is just a common request, the only difference is that when proxies are provided
@@ -15,6 +15,7 @@ setup(
         "inquirer==2.7.0",
         "edlib==1.3.8",
         "xmltodict==0.12.0",
+        "orjson==3.8.3",
         "typer==0.9.0",
         'importlib-metadata==1.0; python_version < "3.8"',
     ],
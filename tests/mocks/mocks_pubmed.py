@@ -1,8 +1,9 @@
 import os
+import copy
+import uuid
 import pytest
-import xmltodict
 import random
-import datetime
+from lxml import etree
 import findpapers.searchers.pubmed_searcher as pubmed_searcher
 
 
@@ -12,8 +13,8 @@ def mock_pubmed_get_api_result(monkeypatch):
     def mocked_data(*args, **kwargs):
         dirname = os.path.dirname(__file__)
         filename = os.path.join(dirname, '../data/pubmed-api-search.xml')
-        with open(filename) as f:
-            data = xmltodict.parse(f.read())
+        with open(filename, 'rb') as f:
+            data = etree.fromstring(f.read(), pubmed_searcher.XML_PARSER)
         return data
 
     monkeypatch.setattr(pubmed_searcher, '_get_api_result', mocked_data)
@@ -22,21 +23,30 @@ def mock_pubmed_get_api_result(monkeypatch):
 @pytest.fixture(autouse=True)
 def mock_pubmed_get_paper_entry(monkeypatch):
 
-    def mocked_data(*args, **kwargs):
+    def mocked_data(pubmed_id, *args, **kwargs):
         dirname = os.path.dirname(__file__)
         filename = os.path.join(dirname, '../data/pubmed-api-paper.xml')
-        with open(filename) as f:
-            data = xmltodict.parse(f.read())
+        with open(filename, 'rb') as f:
+            data = etree.fromstring(f.read(), pubmed_searcher.XML_PARSER)
 
-        data['PubmedArticleSet']['PubmedArticle']['MedlineCitation'][
-            'Article']['ArticleTitle'] = f'FAKE-TITLE-{datetime.datetime.now()}'
-        data['PubmedArticleSet']['PubmedArticle']['PubmedData']['ArticleIdList'][
-            'ArticleId'][1]['#text'] = f'FAKE-DOI-{datetime.datetime.now()}'
+        paper_entry = data.find('PubmedArticle')
+        data.remove(paper_entry)
 
-        if random.random() > 0.5:
-            data['PubmedArticleSet']['PubmedArticle']['MedlineCitation'][
-            'Article']['Pagination']['MedlinePgn'] = f'{random.randint(1,100)}-{random.randint(1,100)}'
+        pubmed_ids = pubmed_id if isinstance(pubmed_id, list) else [pubmed_id]
 
-        return data
+        for _ in pubmed_ids:
+            new_paper_entry = copy.deepcopy(paper_entry)
+
+            new_paper_entry.find('MedlineCitation/Article/ArticleTitle').text = f'FAKE-TITLE-{uuid.uuid4()}'
+            new_paper_entry.find(
+                'PubmedData/ArticleIdList/ArticleId[@IdType="doi"]').text = f'FAKE-DOI-{uuid.uuid4()}'
+
+            if random.random() > 0.5:
+                new_paper_entry.find(
+                    'MedlineCitation/Article/Pagination/MedlinePgn').text = f'{random.randint(1,100)}-{random.randint(1,100)}'
+
+            data.append(new_paper_entry)
+
+        return etree.tostring(data)
 
     monkeypatch.setattr(pubmed_searcher, '_get_paper_entry', mocked_data)
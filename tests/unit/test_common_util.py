@@ -1,3 +1,5 @@
+import time
+import threading
 import pytest
 from typing import Callable, Any
 import findpapers.utils.common_util as util
@@ -21,3 +23,22 @@ def test_get_numeric_month_by_string(string_format: str, numeric_format: str):
 def test_try_success(func: Callable, result: Any):
 
     assert util.try_success(func, 2, 1) == result
+
+
+def test_request_throttle():
+
+    throttle = util.RequestThrottle(0.1)
+    request_times = []
+
+    def _do_request():
+        throttle.wait()
+        request_times.append(time.monotonic())
+
+    threads = [threading.Thread(target=_do_request) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 4 requests need at least 3 intervals between them
+    assert max(request_times) - min(request_times) >= 0.25
@@ -0,0 +1,124 @@
+import io
+import os
+import copy
+import time
+import threading
+import concurrent.futures
+import pytest
+import requests
+import findpapers.tools.downloader_tool as downloader_tool
+from findpapers.models.paper import Paper
+from findpapers.utils.requests_util import DefaultSession
+
+DEAD_URLS = ['https://dead-a.org/paper', 'https://dead-b.org/paper']
+PDF_URL = 'https://alive.org/paper.pdf'
+
+
+@pytest.fixture(autouse=True)
+def mock_default_session_request(monkeypatch):
+
+    def mocked_request(self, method, url, **kwargs):
+        response = requests.Response()
+        if url in DEAD_URLS:  # that's what DefaultSession returns when a request fails
+            response.status_code = 500
+        else:
+            response.status_code = 200
+            response.url = url
+            response.headers['content-type'] = 'application/pdf'
+            response.raw = io.BytesIO(b'%PDF-fake content')
+        return response
+
+    monkeypatch.setattr(DefaultSession, 'request', mocked_request)
+
+
+def test_find_pdf_url_with_dead_urls(paper: Paper):
+
+    paper.urls = set(DEAD_URLS)
+
+    assert downloader_tool.find_pdf_url(paper) is None
+
+
+def test_download_paper_with_dead_urls(paper: Paper, tmp_path):
+
+    paper.urls = set(DEAD_URLS + [PDF_URL])
+
+    output_filepath = downloader_tool.download_paper(paper, str(tmp_path))
+
+    assert paper.pdf_url == PDF_URL
+    with open(output_filepath, 'rb') as fp:
+        assert fp.read() == b'%PDF-fake content'
+
+    paper.pdf_url = DEAD_URLS[0]
+    os.remove(output_filepath)
+
+    downloader_tool.download_paper(paper, str(tmp_path))
+    assert not os.path.exists(output_filepath)
+
+
+def test_download_paper_concurrency_per_host(paper: Paper, tmp_path, monkeypatch):
+
+    lock = threading.Lock()
+    active_requests = [0]
+    max_active_requests = [0]
+
+    def mocked_request(self, method, url, **kwargs):
+        with lock:
+            active_requests[0] += 1
+            max_active_requests[0] = max(max_active_requests[0], active_requests[0])
+        time.sleep(0.05)
+        with lock:
+            active_requests[0] -= 1
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers['content-type'] = 'application/pdf'
+        response.raw = io.BytesIO(b'%PDF-fake content')
+        return response
+
+    monkeypatch.setattr(DefaultSession, 'request', mocked_request)
+
+    papers = []
+    for i in range(10):
+        other_paper = copy.deepcopy(paper)
+        other_paper.title = f'paper {i}'
+        other_paper.urls = {f'https://same-host.org/paper-{i}.pdf'}
+        papers.append(other_paper)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+        list(executor.map(lambda x: downloader_tool.download_paper(x, str(tmp_path)), papers))
+
+    assert 1 < max_active_requests[0] <= downloader_tool.MAX_CONCURRENT_REQUESTS_PER_HOST
+    assert all(x.pdf_url is not None for x in papers)
+
+
+def test_download_papers_with_same_output_filepath(paper: Paper, tmp_path, monkeypatch):
+
+    requested_urls = []
+
+    def mocked_request(self, method, url, **kwargs):
+        requested_urls.append(url)
+        time.sleep(0.05)
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers['content-type'] = 'application/pdf'
+        response.raw = io.BytesIO(f'%PDF-{url}'.encode())
+        return response
+
+    monkeypatch.setattr(DefaultSession, 'request', mocked_request)
+
+    papers = []
+    for i in range(5):
+        other_paper = copy.deepcopy(paper)  # same publication year and title
+        other_paper.urls = {f'https://host-{i}.org/paper.pdf'}
+        papers.append(other_paper)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+        output_filepaths = list(executor.map(lambda x: downloader_tool.download_paper(x, str(tmp_path)), papers))
+
+    assert len(set(output_filepaths)) == 1
+    assert len(requested_urls) == 1
+    with open(output_filepaths[0], 'rb') as fp:
+        assert fp.read() == f'%PDF-{requested_urls[0]}'.encode()
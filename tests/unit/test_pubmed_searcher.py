@@ -1,60 +1,61 @@
 import copy
 import datetime
 import pytest
+import requests
+from lxml import etree
 import findpapers.searchers.pubmed_searcher as pubmed_searcher
+import findpapers.utils.common_util as common_util
+from findpapers.utils.requests_util import DefaultSession
 from findpapers.models.search import Search
 from findpapers.models.publication import Publication
 
-paper_entry = {
-    'PubmedArticleSet': {
-        'PubmedArticle': {
-            'MedlineCitation': {
-                'Article': {
-                    'Journal': {
-                        'Title': 'fake publication title',
-                        'ISSN': {
-                            '#text': 'fake-issn'
-                        },
-                        'JournalIssue': {
-                            'PubDate': {
-                                'Month': 'Feb',
-                                'Year': '2020'
-                            }
-                        }
-                    },
-                    'ArticleTitle': 'fake paper title',
-                    'ArticleDate': {
-                        'Day': '01',
-                        'Month': '02',
-                        'Year': '2020',
-                    },
-                    'Abstract': {
-                        'AbstractText': 'fake paper abstract'
-                    },
-                    'AuthorList': {
-                        'Author': [
-                            {'ForeName': 'author', 'LastName': 'A'},
-                            {'ForeName': 'author', 'LastName': 'B'}
-                        ]
-                    }
-                },
-                'KeywordList': {
-                    'Keyword': [
-                        {'#text': 'term A'},
-                        {'#text': 'term B'}
-                    ]
-                }
-            },
-            'PubmedData': {
-                'ArticleIdList': {
-                    'ArticleId': [
-                        {'@IdType': 'doi', '#text': 'fake-doi'}
-                    ]
-                }
-            }
-        }
-    }
-}
+paper_entry = etree.fromstring("""
+<PubmedArticle>
+    <MedlineCitation>
+        <Article>
+            <Journal>
+                <ISSN IssnType="Electronic">fake-issn</ISSN>
+                <JournalIssue>
+                    <PubDate>
+                        <Year>2020</Year>
+                        <Month>Feb</Month>
+                    </PubDate>
+                </JournalIssue>
+                <Title>fake publication title</Title>
+            </Journal>
+            <ArticleTitle>fake paper title</ArticleTitle>
+            <Abstract>
+                <AbstractText>fake paper abstract</AbstractText>
+            </Abstract>
+            <AuthorList>
+                <Author>
+                    <LastName>A</LastName>
+                    <ForeName>author</ForeName>
+                </Author>
+                <Author>
+                    <LastName>B</LastName>
+                    <ForeName>author</ForeName>
+                </Author>
+            </AuthorList>
+            <ArticleDate DateType="Electronic">
+                <Year>2020</Year>
+                <Month>02</Month>
+                <Day>01</Day>
+            </ArticleDate>
+        </Article>
+        <KeywordList>
+            <Keyword MajorTopicYN="N">term A</Keyword>
+            <Keyword MajorTopicYN="N">term B</Keyword>
+        </KeywordList>
+    </MedlineCitation>
+    <PubmedData>
+        <ArticleIdList>
+            <ArticleId IdType="pubmed">fake-pubmed-id</ArticleId>
+            <ArticleId IdType="doi">fake-doi</ArticleId>
+        </ArticleIdList>
+    </PubmedData>
+</PubmedArticle>
+""")
 
 
 def test_mocks():
@@ -75,6 +76,76 @@ def test_get_search_url(search: Search):
     assert pubmed_searcher._get_search_url(search, start_record) == url
 
 
+@pytest.fixture
+def mock_rate_limited_request(monkeypatch):
+
+    status_codes = []
+    requested_urls = []
+    delays = []
+
+    def mocked_request(self, method, url, **kwargs):
+        requested_urls.append(url)
+        response = requests.Response()
+        response.status_code = status_codes.pop(0) if len(status_codes) > 0 else 429
+        response._content = b'<eSearchResult/>'
+        return response
+
+    monkeypatch.setattr(DefaultSession, 'request', mocked_request)
+    monkeypatch.setattr(pubmed_searcher, 'NCBI_THROTTLE', common_util.RequestThrottle(0))
+    monkeypatch.setattr(pubmed_searcher.time, 'sleep', lambda x: delays.append(x))
+
+    return status_codes, requested_urls, delays
+
+
+def test_get_content_with_rate_limit(mock_rate_limited_request):
+
+    status_codes, requested_urls, delays = mock_rate_limited_request
+    status_codes.extend([429, 429, 200])
+
+    assert pubmed_searcher._get_content('https://fake-url') == b'<eSearchResult/>'
+    assert len(requested_urls) == 3
+    assert delays == [1, 2]
+
+
+def test_get_content_with_exceeded_rate_limit(mock_rate_limited_request):
+
+    _, requested_urls, delays = mock_rate_limited_request
+
+    with pytest.raises(requests.HTTPError):
+        pubmed_searcher._get_content('https://fake-url')
+
+    assert len(requested_urls) == 5
+    assert delays == [1, 2, 4, 8]
+
+
+def test_get_paper_entries_page(search: Search):
+
+    paper_entries = pubmed_searcher._get_paper_entries_page(search, 50)
+
+    assert len(list(pubmed_searcher._get_paper_entries(paper_entries))) == 50
+
+
+def test_get_paper_entries_without_resolving_entities(tmp_path):
+
+    secret_file = tmp_path / 'secret.txt'
+    secret_file.write_text('SECRET-CONTENT')
+
+    content = f"""<?xml version="1.0"?>
+    <!DOCTYPE PubmedArticleSet [<!ENTITY secret SYSTEM "{secret_file.as_uri()}">]>
+    <PubmedArticleSet>
+        <PubmedArticle><MedlineCitation><Article><ArticleTitle>&secret;</ArticleTitle></Article></MedlineCitation></PubmedArticle>
+    </PubmedArticleSet>
+    """.encode()
+
+    paper_entry = next(pubmed_searcher._get_paper_entries(content))
+
+    assert 'SECRET-CONTENT' not in pubmed_searcher.PAPER_TITLE_XPATH(paper_entry)
+
+    api_result = etree.fromstring(content, pubmed_searcher.XML_PARSER)
+
+    assert 'SECRET-CONTENT' not in etree.tostring(api_result).decode()
+
+
 def test_get_publication():
 
     publication = pubmed_searcher._get_publication(paper_entry)
@@ -104,18 +175,18 @@ def test_get_paper(publication: Publication):
     assert len(paper.urls) == 0
 
     alternative_paper_entry = copy.deepcopy(paper_entry)
-    del alternative_paper_entry['PubmedArticleSet']['PubmedArticle']['MedlineCitation']['Article']['ArticleDate']
-    alternative_paper_entry['PubmedArticleSet']['PubmedArticle'][
-        'MedlineCitation']['Article']['Abstract']['AbstractText'] = [{'#text': 'fake paper abstract'}, {'#text': None}]
-    del alternative_paper_entry['PubmedArticleSet']['PubmedArticle']['MedlineCitation']['KeywordList']
+    article = alternative_paper_entry.find('MedlineCitation/Article')
+    article.remove(article.find('ArticleDate'))
+    etree.SubElement(article.find('Abstract'), 'AbstractText')
+    alternative_paper_entry.find('MedlineCitation').remove(
+        alternative_paper_entry.find('MedlineCitation/KeywordList'))
 
     paper = pubmed_searcher._get_paper(alternative_paper_entry, publication)
     assert paper.publication_date == datetime.date(2020, 2, 1)
     assert paper.abstract == 'fake paper abstract\n'
 
     alternative_paper_entry = copy.deepcopy(paper_entry)
-    alternative_paper_entry['PubmedArticleSet']['PubmedArticle'][
-        'MedlineCitation']['Article']['ArticleDate']['Month'] = 'INVALID MONTH'
+    alternative_paper_entry.find('MedlineCitation/Article/ArticleDate/Month').text = 'INVALID MONTH'
 
     paper = pubmed_searcher._get_paper(alternative_paper_entry, publication)
     assert paper.publication_date == datetime.date(2020, 1, 1)
@@ -127,3 +198,36 @@ def test_run(search: Search):
     pubmed_searcher.run(search)
 
     assert len(search.papers) == 51
+
+
+def test_run_with_small_limit(search: Search, monkeypatch):
+
+    fetched_pages = []
+    get_paper_entries_page = pubmed_searcher._get_paper_entries_page
+
+    def _get_paper_entries_page_spy(search: Search, start_record: int):
+        fetched_pages.append(start_record)
+        return get_paper_entries_page(search, start_record)
+
+    monkeypatch.setattr(pubmed_searcher, '_get_paper_entries_page', _get_paper_entries_page_spy)
+
+    search.limit = 20
+    pubmed_searcher.run(search)
+
+    assert len(search.papers) == 20
+    assert len(fetched_pages) == 0  # the first page is enough
+
+
+def test_run_with_reached_limit(search: Search, paper, monkeypatch):
+
+    def _get_api_result_spy(*args, **kwargs):  # pragma: no cover
+        raise AssertionError('PubMed API should not be requested')
+
+    monkeypatch.setattr(pubmed_searcher, '_get_api_result', _get_api_result_spy)
+    monkeypatch.setattr(pubmed_searcher, '_get_paper_entry', _get_api_result_spy)
+
+    search.limit = 1
+    search.add_paper(paper)
+    pubmed_searcher.run(search)
+
+    assert len(search.papers) == 1